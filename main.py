@@ -9,10 +9,9 @@ Examples:
     python main.py  # Interactive course selection
 """
 
+import asyncio
 import sys
 
-import pandas as pd
-
 from config import COURSES
 from notion_helper import NotionHelper
 from scraper import PrairieLearnScraper
@@ -24,18 +23,24 @@ def display_assignments(assignments: list) -> None:
         print("No assignments found.")
         return
 
-    data = [
-        {
-            "Name": a.assignment_name,
-            "Project": a.project,
-            "Due": a.due.strftime("%Y-%m-%d %H:%M") if a.due else "None",
-            "Unlock": a.reminder.strftime("%Y-%m-%d %H:%M") if a.reminder else "None",
-        }
+    columns = ("Name", "Project", "Due", "Unlock")
+    rows = [
+        (
+            a.assignment_name,
+            a.project,
+            a.due.strftime("%Y-%m-%d %H:%M") if a.due else "None",
+            a.reminder.strftime("%Y-%m-%d %H:%M") if a.reminder else "None",
+        )
         for a in assignments
     ]
-    df = pd.DataFrame(data)
+    widths = [
+        max(len(col), *(len(row[i]) for row in rows)) for i, col in enumerate(columns)
+    ]
+
     print("\nScraped Assignments:")
-    print(df.to_string(index=False))
+    print("  ".join(col.rjust(w) for col, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(cell.rjust(w) for cell, w in zip(row, widths)))
     print(f"\nTotal: {len(assignments)} assignments")
 
 
@@ -74,6 +79,12 @@ def confirm_import() -> bool:
         print("Please enter 'yes' or 'no'.")
 
 
+async def import_to_notion(assignments: list) -> None:
+    """Import assignments to Notion, closing the client afterwards."""
+    async with NotionHelper() as notion:
+        await notion.import_assignments(assignments)
+
+
 def main() -> None:
     """Main entry point."""
     # Get course selection
@@ -103,8 +114,7 @@ def main() -> None:
 
     # Confirm and import
     if confirm_import():
-        notion = NotionHelper()
-        notion.import_assignments(assignments)
+        asyncio.run(import_to_notion(assignments))
         print("Import complete!")
     else:
         print("Import cancelled.")
@@ -2,9 +2,12 @@
 Notion API helper functions.
 """
 
+import asyncio
 import os
+from collections.abc import Awaitable
 from dataclasses import dataclass
 from datetime import datetime
+from functools import cached_property
 from typing import Any
 
 import httpx
@@ -14,6 +17,13 @@ load_dotenv()
 
 NOTION_API_VERSION = "2022-06-28"
 NOTION_BASE_URL = "https://api.notion.com/v1"
+# Cap on assignment imports in flight at once. This is not a rate limit:
+# Notion averages ~3 req/s, and bursts above that fall back on 429 retries.
+MAX_CONCURRENT_REQUESTS = 3
+MAX_RETRIES = 3
+RATE_LIMIT_STATUS = 429
+SERVER_ERROR_STATUS_CODES = {500, 502, 503, 504}
+QUERY_PAGE_SIZE = 100  # Notion's default and maximum; set explicitly for clarity
 
 
 @dataclass
@@ -26,6 +36,16 @@ class AssignmentData:
     due: datetime | None
     reminder: datetime | None
 
+    @cached_property
+    def due_str(self) -> str | None:
+        """Due date formatted as a Notion date string."""
+        return self.due.strftime("%Y-%m-%d") if self.due else None
+
+    @cached_property
+    def reminder_str(self) -> str | None:
+        """Reminder date formatted as a Notion date string."""
+        return self.reminder.strftime("%Y-%m-%d") if self.reminder else None
+
 
 class NotionHelper:
     """Helper class for Notion API operations."""
@@ -44,47 +64,108 @@ class NotionHelper:
             "Notion-Version": NOTION_API_VERSION,
             "Content-Type": "application/json",
         }
-        self._http = httpx.Client(headers=self._headers, timeout=30.0)
+        self._http = httpx.AsyncClient(
+            headers=self._headers,
+            timeout=30.0,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=20,
+                max_keepalive_connections=20,
+                keepalive_expiry=30.0,
+            ),
+        )
+        # Bounds in-flight assignment imports; the lock serializes schema edits
+        # so concurrent creates don't add the same select option twice.
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self._schema_lock = asyncio.Lock()
+        self._schema_cache: dict[str, Any] | None = None
+        # Select option IDs already resolved, keyed by (property, option name)
+        self._created_options: dict[tuple[str, str], str] = {}
+
+    async def __aenter__(self) -> "NotionHelper":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client."""
+        await self._http.aclose()
 
-    def _request(
-        self, method: str, endpoint: str, body: dict[str, Any] | None = None
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        body: dict[str, Any] | None = None,
+        idempotent: bool | None = None,
     ) -> dict[str, Any]:
-        """Make a request to the Notion API."""
+        """
+        Make a request to the Notion API, retrying rate-limited requests with
+        backoff (honoring Retry-After when Notion sends it). Server errors are
+        only retried for idempotent requests, since a gateway error can arrive
+        after the write went through. POSTs are non-idempotent by default.
+        """
+        if idempotent is None:
+            idempotent = method != "POST"
+        retry_statuses = {RATE_LIMIT_STATUS}
+        if idempotent:
+            retry_statuses |= SERVER_ERROR_STATUS_CODES
+
         url = f"{NOTION_BASE_URL}/{endpoint}"
-        response = self._http.request(method, url, json=body)
+        for attempt in range(MAX_RETRIES + 1):
+            response = await self._http.request(method, url, json=body)
+            if response.status_code not in retry_statuses or attempt == MAX_RETRIES:
+                break
+            try:
+                delay = float(response.headers.get("Retry-After", ""))
+            except ValueError:
+                delay = 2.0**attempt
+            await asyncio.sleep(delay)
         response.raise_for_status()
         return response.json()
 
-    def _query_database(self, start_cursor: str | None = None) -> dict[str, Any]:
+    async def _query_database(self, start_cursor: str | None = None) -> dict[str, Any]:
         """Query database."""
-        body: dict[str, Any] = {}
+        body: dict[str, Any] = {"page_size": QUERY_PAGE_SIZE}
         if start_cursor:
             body["start_cursor"] = start_cursor
-        return self._request("POST", f"databases/{self.database_id}/query", body)
+        # Queries are read-only, so they are safe to retry despite being POSTs
+        return await self._request(
+            "POST", f"databases/{self.database_id}/query", body, idempotent=True
+        )
 
-    def _retrieve_database(self) -> dict[str, Any]:
-        """Retrieve database schema."""
-        return self._request("GET", f"databases/{self.database_id}")
+    async def _retrieve_database(self) -> dict[str, Any]:
+        """Retrieve database schema, using the cached copy when available."""
+        if self._schema_cache is None:
+            self._schema_cache = await self._request(
+                "GET", f"databases/{self.database_id}"
+            )
+        return self._schema_cache
 
-    def _update_database(self, properties: dict[str, Any]) -> dict[str, Any]:
-        """Update database schema."""
-        return self._request(
+    async def _update_database(self, properties: dict[str, Any]) -> dict[str, Any]:
+        """Update database schema and refresh the cached copy."""
+        self._schema_cache = await self._request(
             "PATCH", f"databases/{self.database_id}", {"properties": properties}
         )
+        return self._schema_cache
 
-    def _create_page(self, properties: dict[str, Any]) -> dict[str, Any]:
+    async def _create_page(self, properties: dict[str, Any]) -> dict[str, Any]:
         """Create a new page in the database."""
-        return self._request(
+        return await self._request(
             "POST",
             "pages",
             {"parent": {"database_id": self.database_id}, "properties": properties},
         )
 
-    def _update_page(self, page_id: str, properties: dict[str, Any]) -> dict[str, Any]:
+    async def _update_page(
+        self, page_id: str, properties: dict[str, Any]
+    ) -> dict[str, Any]:
         """Update a page."""
-        return self._request("PATCH", f"pages/{page_id}", {"properties": properties})
+        return await self._request(
+            "PATCH", f"pages/{page_id}", {"properties": properties}
+        )
 
-    def get_existing_assignments(self) -> dict[str, dict[str, Any]]:
+    async def get_existing_assignments(self) -> dict[str, dict[str, Any]]:
         """Fetch existing assignments from Notion database."""
         existing_assignments: dict[str, dict[str, Any]] = {}
 
@@ -93,125 +174,210 @@ class NotionHelper:
         start_cursor = None
 
         while has_more:
-            response = self._query_database(start_cursor)
+            response = await self._query_database(start_cursor)
             results = response.get("results", [])
 
             for page in results:
-                try:
-                    name = page["properties"]["Name"]["title"][0]["plain_text"]
-                    due_date = page["properties"]["Due"]["date"]
-                    existing_assignments[name] = {
-                        "id": page["id"],
-                        "due": due_date["start"] if due_date else None,
-                    }
-                except (KeyError, IndexError, TypeError):
+                # Skip pages without a title rather than raising on them
+                props = page.get("properties") or {}
+                title = (props.get("Name") or {}).get("title") or []
+                if not title:
+                    continue
+                name = title[0].get("plain_text")
+                if not name:
                     continue
+                due_date = (props.get("Due") or {}).get("date")
+                existing_assignments[name] = {
+                    "id": page.get("id"),
+                    "due": due_date.get("start") if due_date else None,
+                }
 
             has_more = response.get("has_more", False)
             start_cursor = response.get("next_cursor")
 
         return existing_assignments
 
-    def ensure_select_option_exists(
+    async def ensure_select_option_exists(
         self, property_name: str, option_name: str
     ) -> str | None:
         """Ensure a select option exists in the database schema."""
-        db = self._retrieve_database()
-        property_schema = db["properties"][property_name]
-
-        # Check if option already exists
-        for option in property_schema["select"]["options"]:
-            if option["name"] == option_name:
-                return option["id"]
+        option_id = self._created_options.get((property_name, option_name))
+        if option_id:
+            return option_id
 
-        # Create new option
+        option_ids = await self.ensure_select_options_exist_bulk(
+            property_name, {option_name}
+        )
+        return option_ids.get(option_name)
+
+    async def ensure_select_options_exist_bulk(
+        self, property_name: str, option_names: set[str]
+    ) -> dict[str, str]:
+        """
+        Ensure several select options exist, creating any missing ones in a
+        single schema update. Returns a mapping of option name to option ID.
+        """
+        known = {
+            name: self._created_options[(property_name, name)]
+            for name in option_names
+            if (property_name, name) in self._created_options
+        }
+        if len(known) == len(option_names):
+            return known
+
+        async with self._schema_lock:
+            db = await self._retrieve_database()
+            options = db["properties"][property_name]["select"]["options"]
+            option_ids = {
+                opt["name"]: opt["id"] for opt in options if opt["name"] in option_names
+            }
+
+            missing = sorted(option_names - option_ids.keys())
+            if not missing:
+                self._remember_options(property_name, option_ids)
+                return option_ids
+
+            # Create new options
+            try:
+                # Extract only the fields Notion expects (id, name, color)
+                # to preserve existing options
+                existing_options = [
+                    {k: v for k, v in opt.items() if k in ("id", "name", "color")}
+                    for opt in options
+                ]
+                new_options = existing_options + [
+                    {"name": name, "color": "default"} for name in missing
+                ]
+                updated_db = await self._update_database(
+                    {property_name: {"select": {"options": new_options}}}
+                )
+                for name in missing:
+                    print(f"Created select option '{name}' for '{property_name}'")
+
+                # Collect the new options' IDs
+                for option in updated_db["properties"][property_name]["select"][
+                    "options"
+                ]:
+                    if option["name"] in option_names:
+                        option_ids[option["name"]] = option["id"]
+            except httpx.HTTPError as e:
+                print(f"Error creating select options {missing}: {e}")
+
+            self._remember_options(property_name, option_ids)
+            return option_ids
+
+    def _remember_options(self, property_name: str, option_ids: dict[str, str]) -> None:
+        """Record resolved select option IDs so later lookups skip the schema."""
+        for name, option_id in option_ids.items():
+            self._created_options[(property_name, name)] = option_id
+
+    async def update_assignment(
+        self, page_id: str, assignment: AssignmentData
+    ) -> bool:
+        """Update the deadline of an existing assignment page."""
+        name = assignment.assignment_name
+        due_date_str = assignment.due_str
         try:
-            # Extract only the fields Notion expects (id, name, color) to preserve existing options
-            existing_options = [
-                {k: v for k, v in opt.items() if k in ("id", "name", "color")}
-                for opt in property_schema["select"]["options"]
-            ]
-            new_options = existing_options + [
-                {"name": option_name, "color": "default"}
-            ]
-            updated_db = self._update_database(
-                {property_name: {"select": {"options": new_options}}}
+            await self._update_page(
+                page_id,
+                {"Due": {"date": {"start": due_date_str} if due_date_str else None}},
             )
-            print(f"Created select option '{option_name}' for '{property_name}'")
-
-            # Return the new option's ID
-            for option in updated_db["properties"][property_name]["select"]["options"]:
-                if option["name"] == option_name:
-                    return option["id"]
-        except httpx.HTTPStatusError as e:
-            print(f"Error creating select option '{option_name}': {e}")
+            print(f"Updated: {name}")
+            return True
+        except httpx.HTTPError as e:
+            print(f"Error updating '{name}': {e}")
+            return False
+
+    async def create_assignment(self, assignment: AssignmentData) -> bool:
+        """Create a new assignment page."""
+        name = assignment.assignment_name
+        due_date_str = assignment.due_str
+        reminder_date_str = assignment.reminder_str
 
-        return None
+        try:
+            course_id = await self.ensure_select_option_exists(
+                "Course", assignment.course_name
+            )
+            project_id = await self.ensure_select_option_exists(
+                "Project", assignment.project
+            )
 
-    def update_or_create_assignment(
-        self,
-        assignment: AssignmentData,
-        existing_assignments: dict[str, dict[str, Any]],
-    ) -> None:
-        """Update an existing assignment or create a new one."""
-        name = assignment.assignment_name
-        due_date_str = assignment.due.strftime("%Y-%m-%d") if assignment.due else None
-        reminder_date_str = (
-            assignment.reminder.strftime("%Y-%m-%d") if assignment.reminder else None
-        )
+            properties: dict[str, Any] = {
+                "Name": {"title": [{"text": {"content": name}}]},
+                "Status": {"status": {"name": "To-do"}},
+                "Due": {"date": {"start": due_date_str} if due_date_str else None},
+                "Reminder/Start/Unlock": {
+                    "date": {"start": reminder_date_str} if reminder_date_str else None
+                },
+            }
+
+            if course_id:
+                properties["Course"] = {"select": {"id": course_id}}
+            if project_id:
+                properties["Project"] = {"select": {"id": project_id}}
+
+            await self._create_page(properties)
+            print(f"Created: {name}")
+            return True
+        except httpx.HTTPError as e:
+            print(f"Error creating '{name}': {e}")
+            return False
+
+    async def import_assignments(self, assignments: list[AssignmentData]) -> None:
+        """Import a list of assignments to Notion."""
+        existing = await self.get_existing_assignments()
 
-        if name in existing_assignments:
-            # Update if deadline changed
-            if existing_assignments[name]["due"] != due_date_str:
-                page_id = existing_assignments[name]["id"]
-                try:
-                    self._update_page(
-                        page_id,
-                        {
-                            "Due": {
-                                "date": {"start": due_date_str}
-                                if due_date_str
-                                else None
-                            }
-                        },
-                    )
-                    print(f"Updated: {name}")
-                except httpx.HTTPStatusError as e:
-                    print(f"Error updating '{name}': {e}")
-        else:
-            # Create new assignment
+        # Partition up front so only new or changed assignments hit the API
+        to_create: list[AssignmentData] = []
+        to_update: list[tuple[str, AssignmentData]] = []
+        unchanged: list[AssignmentData] = []
+        for assignment in assignments:
+            current = existing.get(assignment.assignment_name)
+            if current is None:
+                to_create.append(assignment)
+                continue
+            if current["due"] != assignment.due_str:
+                to_update.append((current["id"], assignment))
+            else:
+                unchanged.append(assignment)
+
+        if unchanged:
+            print(f"{len(unchanged)} unchanged")
+        if not to_create and not to_update:
+            print("\nNotion is already up to date.")
+            return
+
+        # Create every select option new pages will need up front; on failure
+        # each create falls back to resolving its own options
+        if to_create:
             try:
-                course_id = self.ensure_select_option_exists(
-                    "Course", assignment.course_name
+                await self.ensure_select_options_exist_bulk(
+                    "Course", {a.course_name for a in to_create}
                 )
-                project_id = self.ensure_select_option_exists(
-                    "Project", assignment.project
+                await self.ensure_select_options_exist_bulk(
+                    "Project", {a.project for a in to_create}
                 )
+            except httpx.HTTPError as e:
+                print(f"Error preparing select options: {e}")
+
+        async def bounded(coro: Awaitable[bool]) -> bool:
+            async with self._semaphore:
+                return await coro
+
+        # A TaskGroup cancels the remaining imports if one fails unexpectedly,
+        # so none are left running against a closed client
+        async with asyncio.TaskGroup() as tg:
+            creates = [
+                tg.create_task(bounded(self.create_assignment(a))) for a in to_create
+            ]
+            updates = [
+                tg.create_task(bounded(self.update_assignment(pid, a)))
+                for pid, a in to_update
+            ]
 
-                properties: dict[str, Any] = {
-                    "Name": {"title": [{"text": {"content": name}}]},
-                    "Status": {"status": {"name": "To-do"}},
-                    "Due": {"date": {"start": due_date_str} if due_date_str else None},
-                    "Reminder/Start/Unlock": {
-                        "date": {"start": reminder_date_str}
-                        if reminder_date_str
-                        else None
-                    },
-                }
-
-                if course_id:
-                    properties["Course"] = {"select": {"id": course_id}}
-                if project_id:
-                    properties["Project"] = {"select": {"id": project_id}}
-
-                self._create_page(properties)
-                print(f"Created: {name}")
-            except httpx.HTTPStatusError as e:
-                print(f"Error creating '{name}': {e}")
-
-    def import_assignments(self, assignments: list[AssignmentData]) -> None:
-        """Import a list of assignments to Notion."""
-        existing = self.get_existing_assignments()
-        for assignment in assignments:
-            self.update_or_create_assignment(assignment, existing)
-        print(f"\nImported {len(assignments)} assignments to Notion.")
+        created = sum(task.result() for task in creates)
+        updated = sum(task.result() for task in updates)
+        failed = len(creates) + len(updates) - created - updated
+        print(f"\nCreated {created} and updated {updated} assignments in Notion.")
+        if failed:
+            print(f"{failed} assignments failed to import.")
@@ -4,13 +4,14 @@ PrairieLearn scraper for UBC courses.
 
 import os
 import re
-import time
 from datetime import datetime
 
+import httpx
 import pytz
-from bs4 import BeautifulSoup, Tag
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 from dotenv import load_dotenv
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
@@ -22,6 +23,13 @@ load_dotenv()
 
 TIMEZONE = pytz.timezone("America/Vancouver")
 LOGIN_URL = "https://us.prairielearn.com/pl/login"
+# Persistent Chrome profile so the PrairieLearn session survives between runs
+PROFILE_DIR = os.path.expanduser("~/.prairielearn-scraper-profile")
+
+_TZ_RE = re.compile(r"\s*\(?(PST|PDT)\)?")
+_OFFSET_RE = re.compile(r"[+-]\d{2}$")
+_UNTIL_RE = re.compile(r"(\d+%)\s+until\s+(.+)")
+_STARTING_RE = re.compile(r"(\d+%)\s+starting from\s+(.+)")
 
 
 class PrairieLearnScraper:
@@ -29,28 +37,78 @@ class PrairieLearnScraper:
 
     def __init__(self):
         self.driver: webdriver.Chrome | None = None
+        self._http: httpx.Client | None = None
+        # Pages the browser already rendered, keyed by URL, so they aren't refetched
+        self._page_cache: dict[str, str] = {}
 
     def _init_driver(self) -> None:
         """Initialize Chrome WebDriver."""
-        self.driver = webdriver.Chrome()
+        opts = webdriver.ChromeOptions()
+        # Duo may need the visible window, so headless is opt-in
+        if os.getenv("PL_HEADLESS", "").lower() in ("1", "true", "yes"):
+            opts.add_argument("--headless=new")
+            # Container/server flags; keep the sandbox on for desktop runs
+            opts.add_argument("--no-sandbox")
+            opts.add_argument("--disable-dev-shm-usage")
+        opts.add_argument("--disable-gpu")
+        opts.add_argument("--disable-extensions")
+        opts.add_argument(f"--user-data-dir={PROFILE_DIR}")
+        opts.add_experimental_option(
+            "prefs", {"profile.managed_default_content_settings.images": 2}
+        )
+        self.driver = webdriver.Chrome(options=opts)
+
+    def _has_session(self, config: CourseConfig) -> bool:
+        """Check whether the saved profile is still logged in to PrairieLearn."""
+        if not self.driver:
+            raise RuntimeError("Driver not initialized")
+
+        self.driver.get(config.assessments_url)
+        try:
+            WebDriverWait(self.driver, 10).until(
+                EC.any_of(
+                    EC.presence_of_element_located(
+                        (By.CSS_SELECTOR, 'table[aria-label="Assessments"]')
+                    ),
+                    EC.url_contains("/login"),
+                )
+            )
+        except TimeoutException:
+            # Slow page or no table rendered; only a login redirect means logged out
+            pass
+
+        if "/login" in self.driver.current_url:
+            return False
+        if self.driver.find_elements(
+            By.CSS_SELECTOR, 'table[aria-label="Assessments"]'
+        ):
+            self._page_cache[config.assessments_url] = self.driver.page_source
+        return True
 
-    def _login(self) -> None:
-        """Log in to PrairieLearn using UBC CWL."""
+    def _login(self, config: CourseConfig) -> None:
+        """Log in to PrairieLearn using UBC CWL, unless already logged in."""
         if not self.driver:
             raise RuntimeError("Driver not initialized")
 
+        if self._has_session(config):
+            print("Reusing saved PrairieLearn session.")
+            return
+
         username = os.getenv("PL_USERNAME")
         password = os.getenv("PL_PASSWORD")
 
         if not username or not password:
             raise ValueError("PL_USERNAME and PL_PASSWORD must be set in .env")
 
-        self.driver.get(LOGIN_URL)
-        time.sleep(1)
+        # The session check usually leaves us on the login page already
+        if "/login" not in self.driver.current_url:
+            self.driver.get(LOGIN_URL)
 
-        # Click UBC login
-        self.driver.find_element(
-            By.LINK_TEXT, "University of British Columbia (ubc.ca)"
+        # Click UBC login once the institution list has rendered
+        WebDriverWait(self.driver, 10).until(
+            EC.element_to_be_clickable(
+                (By.LINK_TEXT, "University of British Columbia (ubc.ca)")
+            )
         ).click()
 
         # Wait for login form and enter credentials
@@ -66,18 +124,39 @@ class PrairieLearnScraper:
         WebDriverWait(self.driver, 120).until(EC.url_contains("prairielearn.com"))
         print("Login successful!")
 
-    def _parse_date(self, date_str: str) -> datetime | None:
+    def _start_session(self) -> None:
+        """Hand the authenticated browser session over to an HTTP client."""
+        if not self.driver:
+            raise RuntimeError("Driver not initialized")
+
+        cookies = {c["name"]: c["value"] for c in self.driver.get_cookies()}
+        user_agent = self.driver.execute_script("return navigator.userAgent")
+        self._http = httpx.Client(
+            cookies=cookies,
+            headers={"User-Agent": user_agent},
+            follow_redirects=True,
+            http2=True,
+            timeout=30.0,
+        )
+
+        # The browser is only needed for the interactive login
+        self.driver.quit()
+        self.driver = None
+
+    def _parse_date(
+        self, date_str: str, current_year: int | None = None
+    ) -> datetime | None:
         """Parse a date string from PrairieLearn."""
         if not date_str or date_str == "—":
             return None
 
         # Clean timezone markers
-        date_str = re.sub(r"\s*\(?(PST|PDT)\)?", "", date_str).strip()
+        date_str = _TZ_RE.sub("", date_str).strip()
 
         # Try parsing ISO format first (from popover)
         try:
             # Remove timezone offset suffix (e.g., "-08")
-            if re.search(r"[+-]\d{2}$", date_str):
+            if _OFFSET_RE.search(date_str):
                 date_str = date_str[:-3]
             dt = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
             return TIMEZONE.localize(dt)
@@ -87,7 +166,8 @@ class PrairieLearnScraper:
         # Try human-readable format (e.g., "23:59, Sat, Apr 25")
         try:
             # Parse with current year
-            current_year = datetime.now().year
+            if current_year is None:
+                current_year = datetime.now(TIMEZONE).year
             dt = datetime.strptime(f"{date_str} {current_year}", "%H:%M, %a, %b %d %Y")
             return TIMEZONE.localize(dt)
         except ValueError:
@@ -96,7 +176,7 @@ class PrairieLearnScraper:
         return None
 
     def _parse_available_credit(
-        self, credit_text: str
+        self, credit_text: str, current_year: int | None = None
     ) -> tuple[datetime | None, datetime | None]:
         """
         Parse the 'Available credit' column text.
@@ -109,18 +189,20 @@ class PrairieLearnScraper:
             return None, None
 
         # Pattern: "100% until 23:59, Sat, Apr 25"
-        until_match = re.search(r"(\d+%)\s+until\s+(.+)", credit_text)
+        until_match = _UNTIL_RE.search(credit_text)
         if until_match:
-            deadline = self._parse_date(until_match.group(2))
+            deadline = self._parse_date(until_match.group(2), current_year)
 
         # Pattern: "100% starting from 08:00, Mon, Jan 19"
-        starting_match = re.search(r"(\d+%)\s+starting from\s+(.+)", credit_text)
+        starting_match = _STARTING_RE.search(credit_text)
         if starting_match:
-            unlock_date = self._parse_date(starting_match.group(2))
+            unlock_date = self._parse_date(starting_match.group(2), current_year)
 
         return deadline, unlock_date
 
-    def _scrape_from_popover(self, row: Tag) -> tuple[datetime | None, datetime | None]:
+    def _scrape_from_popover(
+        self, row: Tag, now: datetime
+    ) -> tuple[datetime | None, datetime | None]:
         """Try to extract deadline info from the popover button."""
         popover_button = row.find("button", class_="btn btn-xs btn-ghost")
         if not popover_button:
@@ -130,14 +212,12 @@ class PrairieLearnScraper:
         if not popover_html or not isinstance(popover_html, str):
             return None, None
 
-        popover = BeautifulSoup(popover_html, "html.parser")
+        popover = BeautifulSoup(popover_html, "lxml", parse_only=SoupStrainer("tr"))
         deadline_rows = popover.find_all("tr")[1:]  # Skip header
 
         most_relevant = None
         unlock_date = None
 
-        now = datetime.now(TIMEZONE)
-
         for row in deadline_rows:
             cells = row.find_all("td")
             if len(cells) < 3:
@@ -147,8 +227,8 @@ class PrairieLearnScraper:
             unlock_str = cells[1].text.strip()
             deadline_str = cells[2].text.strip()
 
-            deadline = self._parse_date(deadline_str)
-            parsed_unlock = self._parse_date(unlock_str)
+            deadline = self._parse_date(deadline_str, now.year)
+            parsed_unlock = self._parse_date(unlock_str, now.year)
 
             if parsed_unlock:
                 unlock_date = parsed_unlock
@@ -162,16 +242,17 @@ class PrairieLearnScraper:
 
     def scrape_course(self, config: CourseConfig) -> list[AssignmentData]:
         """Scrape all assessments for a course."""
-        if not self.driver:
-            raise RuntimeError("Driver not initialized")
-
-        self.driver.get(config.assessments_url)
-        time.sleep(2)  # Wait for page load
-
-        html = self.driver.page_source
-        soup = BeautifulSoup(html, "html.parser")
+        html = self._page_cache.get(config.assessments_url)
+        if html is None:
+            if not self._http:
+                raise RuntimeError("HTTP session not initialized")
+            response = self._http.get(config.assessments_url)
+            response.raise_for_status()
+            html = response.text
+        soup = BeautifulSoup(html, "lxml")
 
         assignments: list[AssignmentData] = []
+        now = datetime.now(TIMEZONE)
 
         table = soup.find("table", attrs={"aria-label": "Assessments"})
         if not table:
@@ -183,68 +264,62 @@ class PrairieLearnScraper:
             print("Table body not found")
             return assignments
 
-        # Find project headers
-        project_headers = tbody.find_all(
-            "th", attrs={"data-testid": "assessment-group-heading"}
-        )
-        print(f"Found {len(project_headers)} assessment groups")
-
-        for header in project_headers:
-            project_name = header.text.strip()
-            print(f"\nProcessing: {project_name}")
+        # Walk the rows once; group headings set the project for the rows below
+        rows = tbody.find_all("tr", recursive=False)
+        headings = [
+            row.find("th", attrs={"data-testid": "assessment-group-heading"})
+            for row in rows
+        ]
+        print(f"Found {sum(1 for h in headings if h)} assessment groups")
+
+        project_name: str | None = None
+        for assessment_row, heading in zip(rows, headings):
+            if heading:
+                project_name = heading.text.strip()
+                print(f"\nProcessing: {project_name}")
+                continue
+            if project_name is None:
+                continue
 
-            parent_row = header.find_parent("tr")
-            if not parent_row:
+            name_cells = assessment_row.find_all("td", class_="align-middle")
+            if len(name_cells) < 2:
                 continue
 
-            # Process each assessment row under this project
-            assessment_row = parent_row.find_next_sibling("tr")
-            while assessment_row:
-                # Check if we've hit the next project header
-                if assessment_row.find(
-                    "th", attrs={"data-testid": "assessment-group-heading"}
-                ):
-                    break
-
-                name_cells = assessment_row.find_all("td", class_="align-middle")
-                if len(name_cells) >= 2:
-                    # Get assignment name
-                    name_cell = name_cells[1]
-                    link = name_cell.find("a")
-                    name = link.text.strip() if link else name_cell.text.strip()
-
-                    # Get credit/deadline info - try from third cell first
-                    deadline = None
-                    unlock_date = None
-
-                    if len(name_cells) >= 3:
-                        credit_text = name_cells[2].text.strip()
-                        deadline, unlock_date = self._parse_available_credit(
-                            credit_text
-                        )
-
-                    # If no deadline from text, try popover
-                    if not deadline:
-                        deadline, unlock_from_popover = self._scrape_from_popover(
-                            assessment_row
-                        )
-                        if not unlock_date:
-                            unlock_date = unlock_from_popover
-
-                    # Create assignment name with project prefix
-                    full_name = f"{project_name} - {name}"
-
-                    assignment = AssignmentData(
-                        course_name=config.course_name,
-                        assignment_name=full_name,
-                        project=project_name,
-                        due=deadline,
-                        reminder=unlock_date,
-                    )
-                    assignments.append(assignment)
-                    print(f"  {name}: due={deadline}, unlock={unlock_date}")
-
-                assessment_row = assessment_row.find_next_sibling("tr")
+            # Get assignment name
+            name_cell = name_cells[1]
+            link = name_cell.find("a")
+            name = link.text.strip() if link else name_cell.text.strip()
+
+            # Get credit/deadline info - try from third cell first
+            deadline = None
+            unlock_date = None
+
+            if len(name_cells) >= 3:
+                credit_text = name_cells[2].text.strip()
+                deadline, unlock_date = self._parse_available_credit(
+                    credit_text, now.year
+                )
+
+            # If no deadline from text, try popover
+            if not deadline:
+                deadline, unlock_from_popover = self._scrape_from_popover(
+                    assessment_row, now
+                )
+                if not unlock_date:
+                    unlock_date = unlock_from_popover
+
+            # Create assignment name with project prefix
+            full_name = f"{project_name} - {name}"
+
+            assignment = AssignmentData(
+                course_name=config.course_name,
+                assignment_name=full_name,
+                project=project_name,
+                due=deadline,
+                reminder=unlock_date,
+            )
+            assignments.append(assignment)
+            print(f"  {name}: due={deadline}, unlock={unlock_date}")
 
         return assignments
 
@@ -252,8 +327,11 @@ class PrairieLearnScraper:
         """Run the scraper for a course."""
         try:
             self._init_driver()
-            self._login()
+            self._login(config)
+            self._start_session()
             return self.scrape_course(config)
         finally:
             if self.driver:
                 self.driver.quit()
+            if self._http:
+                self._http.close()